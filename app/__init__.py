@@ -5,10 +5,12 @@ from flask_mail import Mail
 from flask_pagedown import PageDown
 from flask_sqlalchemy import SQLAlchemy
 from config import config
+from .metrics import Metrics
 
 mail = Mail()
 pagedown = PageDown()
 db = SQLAlchemy()
+metrics = Metrics()
 login_manager = LoginManager()
 login_manager.session_protection = 'strong'
 login_manager.login_view = 'auth_api_1_0.login'
@@ -23,6 +25,7 @@ def create_app(config_name):
     mail.init_app(app)
     db.init_app(app)
     login_manager.init_app(app)
+    metrics.init_app(app)
     CORS(app)
 
     if not app.debug and not app.testing and not app.config['SSL_DISABLE']:
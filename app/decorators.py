@@ -0,0 +1,14 @@
+from functools import wraps
+from flask_login import current_user
+from .errors import forbidden
+
+
+def permission_required(permission):
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if not current_user.can(permission):
+                return forbidden('权限不足。')
+            return f(*args, **kwargs)
+        return decorated_function
+    return decorator
@@ -0,0 +1,223 @@
+import bisect, glob, json, mmap, os, struct, threading
+from time import perf_counter
+from flask import Response, g, request
+
+METHODS = frozenset(['GET', 'HEAD', 'POST', 'PUT', 'DELETE', 'PATCH', 'OPTIONS'])
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float('inf'))
+
+REQUESTS = 'fun123_http_requests_total'
+DURATION = 'fun123_http_request_duration_seconds'
+
+HELP = {
+    REQUESTS: ('counter', 'HTTP请求数，按蓝图、端点、方法和状态码分类。'),
+    DURATION: ('histogram', 'HTTP请求耗时（秒），按蓝图和端点分类。'),
+}
+
+
+class MmapDict(object):
+    '''
+    单个进程独占写入的内存映射文件，保存{key: float}。
+    文件格式：前8字节是已用长度，随后逐条记录[4字节key长度][key，补齐到8字节][8字节double]。
+    先写记录再更新已用长度，所以其它进程随时读取都不会读到写了一半的记录。
+    '''
+
+    def __init__(self, path, initial_size=1 << 16):
+        self._f = open(path, 'a+b')
+        size = os.fstat(self._f.fileno()).st_size
+        if size == 0:
+            self._f.truncate(initial_size)
+            size = initial_size
+        self._capacity = size
+        self._m = mmap.mmap(self._f.fileno(), self._capacity)
+        self._used = struct.unpack_from('q', self._m, 0)[0]
+        if self._used == 0:
+            self._used = 8
+            struct.pack_into('q', self._m, 0, self._used)
+        self._positions = {}
+        for key, _, pos in self._read_all(self._m, self._used):
+            self._positions[key] = pos
+
+    @staticmethod
+    def _read_all(data, used):
+        pos = 8
+        while pos < used:
+            length = struct.unpack_from('i', data, pos)[0]
+            padded = length + (-(length + 4) % 8)
+            key = bytes(data[pos + 4:pos + 4 + length]).decode('utf-8')
+            pos += 4 + padded
+            yield key, struct.unpack_from('d', data, pos)[0], pos
+            pos += 8
+
+    @classmethod
+    def read(cls, path):
+        '''只读方式读取一个文件的全部记录，返回[(key, value), ...]。'''
+        with open(path, 'rb') as f:
+            data = f.read()
+        if len(data) < 8:
+            return []
+        used = struct.unpack_from('q', data, 0)[0]
+        return [(key, value) for key, value, _ in cls._read_all(data, used)]
+
+    def _init_value(self, key):
+        encoded = key.encode('utf-8')
+        padded = encoded + b' ' * (-(len(encoded) + 4) % 8)
+        entry = struct.pack('i{}sd'.format(len(padded)), len(encoded), padded, 0.0)
+        while self._used + len(entry) > self._capacity:
+            self._capacity *= 2
+            self._f.truncate(self._capacity)
+            self._m.close()
+            self._m = mmap.mmap(self._f.fileno(), self._capacity)
+        self._m[self._used:self._used + len(entry)] = entry
+        pos = self._used + len(entry) - 8
+        self._used += len(entry)
+        struct.pack_into('q', self._m, 0, self._used)
+        self._positions[key] = pos
+        return pos
+
+    def inc(self, key, amount=1.0):
+        pos = self._positions.get(key)
+        if pos is None:
+            pos = self._init_value(key)
+        value = struct.unpack_from('d', self._m, pos)[0]
+        struct.pack_into('d', self._m, pos, value + amount)
+
+    def close(self):
+        self._m.close()
+        self._f.close()
+
+
+class Metrics(object):
+    '''
+    多进程HTTP指标。每个gunicorn worker写入METRICS_DIR下自己的metrics_<pid>.db，
+    写入时不需要跨进程加锁；/metrics读取目录下所有文件并求和，以Prometheus文本格式输出。
+    用--preload启动时app在master进程中创建，所以文件在fork后按pid惰性打开。
+    部署前应清空METRICS_DIR，否则会累加上一次运行的数据。
+    '''
+
+    def __init__(self, app=None):
+        self.directory = None
+        self._pid = None
+        self._values = None
+        self._keys = {}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.directory = app.config['METRICS_DIR']
+        if self._values is not None:
+            self._values.close()
+        self._pid = None
+        self._values = None
+        os.makedirs(self.directory, exist_ok=True)
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+        app.add_url_rule('/metrics', 'metrics', self.render_response)
+
+    def _before_request(self):
+        g.metrics_start = perf_counter()
+
+    def _after_request(self, response):
+        g.metrics_status = response.status_code
+        return response
+
+    def _teardown_request(self, exc):
+        '''
+        在teardown中记录，这样未处理的异常也能统计到：
+        此时after_request不会执行，handle_exception直接返回500响应。
+        '''
+        start = g.pop('metrics_start', None)
+        status = g.pop('metrics_status', None)
+        if exc is not None:
+            status = 500
+        if start is not None and status is not None and request.endpoint != 'metrics':
+            endpoint = request.endpoint or 'none'
+            blueprint = request.blueprint or endpoint
+            method = request.method if request.method in METHODS else 'other'
+            self.observe(blueprint, endpoint, method, status, perf_counter() - start)
+
+    def _file(self):
+        pid = os.getpid()
+        if pid != self._pid:
+            self._values = MmapDict(os.path.join(self.directory, 'metrics_{}.db'.format(pid)))
+            self._pid = pid
+        return self._values
+
+    def observe(self, blueprint, endpoint, method, status, duration):
+        '''
+        记录一次请求。直方图只累加落入的那一个桶，累计值在输出时再计算。
+        各标签组合的key只编码一次，之后每次请求只需一次字典查找和三次写入。
+        '''
+        le = BUCKETS[bisect.bisect_left(BUCKETS, duration)]
+        labels = (blueprint, endpoint, method, status, le)
+        keys = self._keys.get(labels)
+        if keys is None:
+            keys = self._keys[labels] = make_keys(*labels)
+        with self._lock:
+            values = self._file()
+            values.inc(keys[0])
+            values.inc(keys[1])
+            values.inc(keys[2], duration)
+
+    def collect(self):
+        '''汇总所有进程的数据，返回{key: value}。'''
+        totals = {}
+        for path in glob.glob(os.path.join(self.directory, 'metrics_*.db')):
+            for key, value in MmapDict.read(path):
+                totals[key] = totals.get(key, 0.0) + value
+        return totals
+
+    def render(self):
+        samples = {}
+        histograms = {}
+        for key, value in self.collect().items():
+            name, labels = json.loads(key)
+            if name == DURATION + '_bucket':
+                le = labels.pop()[1]
+                histograms.setdefault(tuple(map(tuple, labels)), {})[le] = value
+            else:
+                samples.setdefault(name, []).append((labels, value))
+        lines = []
+        for name in (REQUESTS, DURATION):
+            kind, text = HELP[name]
+            lines.append('# HELP {} {}'.format(name, text))
+            lines.append('# TYPE {} {}'.format(name, kind))
+            if name == REQUESTS:
+                for labels, value in sorted(samples.get(name, [])):
+                    lines.append(format_sample(name, labels, value))
+                continue
+            sums = dict((tuple(map(tuple, labels)), value)
+                        for labels, value in samples.get(DURATION + '_sum', []))
+            for labels, buckets in sorted(histograms.items()):
+                count = 0.0
+                for b in BUCKETS:
+                    count += buckets.get(format_le(b), 0.0)
+                    lines.append(format_sample(name + '_bucket',
+                                               list(labels) + [('le', format_le(b))], count))
+                lines.append(format_sample(name + '_count', labels, count))
+                lines.append(format_sample(name + '_sum', labels, sums.get(labels, 0.0)))
+        return '\n'.join(lines) + '\n'
+
+    def render_response(self):
+        return Response(self.render(), mimetype='text/plain; version=0.0.4')
+
+
+def make_keys(blueprint, endpoint, method, status, le):
+    '''返回请求数、直方图桶和耗时总和三个key。'''
+    labels = [['blueprint', blueprint], ['endpoint', endpoint]]
+    return (json.dumps([REQUESTS, labels + [['method', method], ['status', str(status)]]]),
+            json.dumps([DURATION + '_bucket', labels + [['le', format_le(le)]]]),
+            json.dumps([DURATION + '_sum', labels]))
+
+
+def format_le(le):
+    return '+Inf' if le == float('inf') else repr(le)
+
+
+def format_sample(name, labels, value):
+    escaped = ','.join('{}="{}"'.format(k, v.replace('\\', '\\\\').replace('\n', '\\n')
+                                        .replace('"', '\\"'))
+                       for k, v in labels)
+    return '{}{{{}}} {}'.format(name, escaped, repr(float(value)))
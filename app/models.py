@@ -4,6 +4,7 @@ from flask_login import UserMixin, AnonymousUserMixin, current_user
 from . import db, login_manager
 from app.errors import ValidationError
 from datetime import datetime
+from sqlalchemy.dialects import postgresql
 from itsdangerous import TimedJSONWebSignatureSerializer as Serializer
 from markdown import markdown
 from werkzeug.security import generate_password_hash, check_password_hash
@@ -73,7 +74,7 @@ class Role(db.Model):
             if role is None:
                 role = Role(name=r)
             role.permissions = roles[r][0]
-            role.default = role[r][1]
+            role.default = roles[r][1]
             db.session.add(role)
         db.session.commit()
         user = User.query.filter_by(email=current_app.config['ADMIN_EMAIL']).first()
@@ -107,14 +108,14 @@ class MarkNovel(db.Model):
 class MarkUploader(db.Model):
     __table__name = 'markuploaders'
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
-    uploader_id = db.Column(db.Integer, db.ForeignKey('films.id'), primary_key=True)
+    uploader_id = db.Column(db.Integer, db.ForeignKey('uploaders.id'), primary_key=True)
     timestamp = db.Column(db.DateTime, default=datetime.now)
 
 
 class Follow(db.Model):
     __table__name = 'follows'
-    follower_id = db.Column(db.Integer, db.Foreign('users.id'), primary_key=True)
-    followed_id = db.Column(db.Integer, db.Foreign('users.id'), primary_key=True)
+    follower_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    followed_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
     timestamp = db.Column(db.DateTime, default=datetime.now)
 
 
@@ -122,7 +123,7 @@ class User(UserMixin, db.Model):
     __tablename__ = 'users'
     id = db.Column(db.Integer, primary_key=True)
     email = db.Column(db.String(64), unique=True, index=True)
-    username = db.Coulmn(db.String(64), unique=True, index=True)
+    username = db.Column(db.String(64), unique=True, index=True)
     password_hash = db.Column(db.String(128))
     avatar_url = db.Column(db.String(128))
     confirmed = db.Column(db.Boolean, default=False)
@@ -252,11 +253,15 @@ class User(UserMixin, db.Model):
 
     def is_following(self, user):
         """是否关注了某个用户"""
-        return self.followeds.query.filter_by(followed_id=user.id).first() is not None
+        if user.id is None:
+            return False
+        return self.followeds.filter_by(followed_id=user.id).first() is not None
 
     def is_followed_by(self, user):
         """是否被某个用户关注"""
-        return self.followers.query.filter_by(follower_id=user.id).first() is not None
+        if user.id is None:
+            return False
+        return self.followers.filter_by(follower_id=user.id).first() is not None
 
     def follow(self, user):
         """添加关注用户"""
@@ -266,7 +271,7 @@ class User(UserMixin, db.Model):
 
     def unfollow(self, user):
         """移除关注用户"""
-        f = self.followeds.query.filter_by(followed_id=user.id).first()
+        f = self.followeds.filter_by(followed_id=user.id).first()
         if f:
             db.session.delete(f)
 
@@ -283,16 +288,54 @@ class User(UserMixin, db.Model):
         cls_id = cls_str.lower() + '_id'
         cls_s = cls_str.lower() + 's'
         d = {cls_id: target.id}
-        return getattr(self, cls_s).query.filter_by(**d).first() is not None
+        return getattr(self, cls_s).filter_by(**d).first() is not None
 
     def mark(self, target, cls_str):
         """添加订阅资源"""
         if not self.have_marked(target, cls_str):
-            markcls = 'Mark' + cls_str.capitalize()
+            markcls = MARK_CLASSES[cls_str.lower()][1]
             d = {'user': self, cls_str: target}
-            f = eval(markcls)(**d)
+            f = markcls(**d)
             db.session.add(f)
 
+    def mark_many(self, items):
+        """批量添加订阅资源。items为(cls_str, id)对，每张Mark表每批固定执行三次查询，返回逐项结果。"""
+        results = {}
+        for cls_str, ids in group_marks(items).items():
+            model, markcls = MARK_CLASSES[cls_str]
+            key = getattr(markcls, cls_str + '_id')
+            for chunk in chunked(ids):
+                found = {i for i, in db.session.query(model.id).filter(model.id.in_(chunk))}
+                exists = {i for i, in db.session.query(key).filter(markcls.user_id == self.id,
+                                                                    key.in_(chunk))}
+                new = found - exists
+                if new:
+                    now = datetime.now()
+                    db.session.execute(insert_ignore(markcls.__table__).values(
+                        [{'user_id': self.id, cls_str + '_id': i, 'timestamp': now} for i in new]))
+                for i in chunk:
+                    results[cls_str, i] = 'marked' if i in new else \
+                        'exists' if i in exists else 'not_found'
+        return [{'type': cls_str, 'id': i, 'result': results.get((cls_str, i), 'invalid')}
+                for cls_str, i in items]
+
+    def unmark_many(self, items):
+        """批量移除订阅资源。items为(cls_str, id)对，每张Mark表每批固定执行两次查询，返回逐项结果。"""
+        results = {}
+        for cls_str, ids in group_marks(items).items():
+            markcls = MARK_CLASSES[cls_str][1]
+            key = getattr(markcls, cls_str + '_id')
+            for chunk in chunked(ids):
+                exists = {i for i, in db.session.query(key).filter(markcls.user_id == self.id,
+                                                                    key.in_(chunk))}
+                if exists:
+                    markcls.query.filter(markcls.user_id == self.id, key.in_(exists)) \
+                        .delete(synchronize_session=False)
+                for i in chunk:
+                    results[cls_str, i] = 'unmarked' if i in exists else 'not_marked'
+        return [{'type': cls_str, 'id': i, 'result': results.get((cls_str, i), 'invalid')}
+                for cls_str, i in items]
+
     @staticmethod
     def all_user_follow_self():
         """所有用户自我关注"""
@@ -322,7 +365,7 @@ role_of_movie = db.Table('role_of_movie',
                          )
 
 
-role_of_tv = db.Table('role_of_movie',
+role_of_tv = db.Table('role_of_tv',
                          db.Column('actor_id', db.Integer, db.ForeignKey('actors.id')),
                          db.Column('tv_id', db.Integer, db.ForeignKey('tvs.id'))
                          )
@@ -340,6 +383,12 @@ class Actor(db.Model):
                              backref=db.backref('actors', lazy='dynamic'),
                              lazy='dynamic')
 
+    def __repr__(self):
+        return '<Actor {}>'.format(self.name)
+
+    def to_json(self):
+        return {'id': self.id, 'name': self.name, 'pic_url': self.pic_url}
+
 
 class Movie(db.Model):
     __tablename__ = 'movies'
@@ -354,6 +403,9 @@ class Movie(db.Model):
     def __repr__(self):
         return '<Movie {}>'.format(self.name)
 
+    def to_json(self):
+        return {'id': self.id, 'name': self.name, 'pic_url': self.pic_url}
+
 
 class TV(db.Model):
     __tablename__ = 'tvs'
@@ -368,6 +420,9 @@ class TV(db.Model):
     def __repr__(self):
         return '<TV {}>'.format(self.name)
 
+    def to_json(self):
+        return {'id': self.id, 'name': self.name, 'pic_url': self.pic_url}
+
 
 class Novel(db.Model):
     __tablename__ = 'novels'
@@ -397,5 +452,86 @@ class Uploader(db.Model):
         return '<Uploader {}>'.format(self.name)
 
 
-
-
+TITLE_TABLES = {
+    'movie': (Movie, MarkMovie, role_of_movie),
+    'tv': (TV, MarkTV, role_of_tv),
+}
+
+
+def load_titles(actor_ids, cls_str):
+    """批量加载多个演员参演的作品，返回{actor_id: [作品, ...]}，只执行一次查询。"""
+    model, _, table = TITLE_TABLES[cls_str]
+    titles = {actor_id: [] for actor_id in actor_ids}
+    if not titles:
+        return titles
+    rows = db.session.query(table.c.actor_id, model).select_from(model) \
+        .join(table, table.c[cls_str + '_id'] == model.id) \
+        .filter(table.c.actor_id.in_(titles)) \
+        .order_by(model.id).all()
+    for actor_id, title in rows:
+        titles[actor_id].append(title)
+    return titles
+
+
+def load_actors(title_ids, cls_str):
+    """批量加载多个作品的演员表，返回{作品id: [Actor, ...]}，只执行一次查询。"""
+    _, _, table = TITLE_TABLES[cls_str]
+    key = table.c[cls_str + '_id']
+    actors = {title_id: [] for title_id in title_ids}
+    if not actors:
+        return actors
+    rows = db.session.query(key, Actor).select_from(Actor) \
+        .join(table, table.c.actor_id == Actor.id) \
+        .filter(key.in_(actors)) \
+        .order_by(Actor.id).all()
+    for title_id, actor in rows:
+        actors[title_id].append(actor)
+    return actors
+
+
+def count_marks(title_ids, cls_str):
+    """批量统计多个作品的订阅数，返回{作品id: 订阅数}，只执行一次查询。"""
+    _, markcls, _ = TITLE_TABLES[cls_str]
+    key = getattr(markcls, cls_str + '_id')
+    counts = {title_id: 0 for title_id in title_ids}
+    if not counts:
+        return counts
+    rows = db.session.query(key, db.func.count(key)) \
+        .filter(key.in_(counts)) \
+        .group_by(key).all()
+    counts.update(rows)
+    return counts
+
+
+MARK_CLASSES = {
+    'movie': (Movie, MarkMovie),
+    'tv': (TV, MarkTV),
+    'novel': (Novel, MarkNovel),
+    'uploader': (Uploader, MarkUploader),
+}
+
+# 每条INSERT有3个绑定参数，300行为900个，低于SQLite 3.32之前999个参数的上限。
+MARK_CHUNK_SIZE = 300
+
+
+def group_marks(items):
+    """把(cls_str, id)对按资源类型分组，返回{cls_str: set(ids)}，忽略未知类型。"""
+    groups = {}
+    for cls_str, id in items:
+        if cls_str in MARK_CLASSES:
+            groups.setdefault(cls_str, set()).add(id)
+    return groups
+
+
+def chunked(ids):
+    """把id排序后按MARK_CHUNK_SIZE切分成多批。"""
+    ids = sorted(ids)
+    for start in range(0, len(ids), MARK_CHUNK_SIZE):
+        yield ids[start:start + MARK_CHUNK_SIZE]
+
+
+def insert_ignore(table):
+    """主键冲突时忽略的INSERT：PostgreSQL用ON CONFLICT DO NOTHING，SQLite用INSERT OR IGNORE。"""
+    if db.engine.dialect.name == 'postgresql':
+        return postgresql.insert(table).on_conflict_do_nothing()
+    return table.insert().prefix_with('OR IGNORE')
@@ -2,3 +2,4 @@ from flask import Blueprint
 
 module = Blueprint('module', __name__)
 
+from . import views
@@ -0,0 +1,133 @@
+from . import module
+from .. import db
+from ..decorators import permission_required
+from ..errors import ValidationError
+from ..models import Actor, Permission, TITLE_TABLES, load_titles, load_actors, count_marks
+from flask import current_app, jsonify, request
+from flask_login import current_user, login_required
+
+
+def titles_to_json(titles, cls_str):
+    """序列化一批作品，附带演员表和订阅数。无论作品多少，固定执行两次查询。"""
+    ids = [title.id for title in titles]
+    actors = load_actors(ids, cls_str)
+    marks = count_marks(ids, cls_str)
+    result = []
+    for title in titles:
+        d = title.to_json()
+        d['actors'] = [actor.to_json() for actor in actors[title.id]]
+        d['marks'] = marks[title.id]
+        result.append(d)
+    return result
+
+
+def actors_to_json(actors):
+    """序列化一批演员，附带其参演的电影、电视剧及各自的演员表和订阅数，固定执行六次查询。"""
+    ids = [actor.id for actor in actors]
+    works = {}
+    for cls_str in TITLE_TABLES:
+        titles = load_titles(ids, cls_str)
+        unique = list({t.id: t for ts in titles.values() for t in ts}.values())
+        serialized = {d['id']: d for d in titles_to_json(unique, cls_str)}
+        works[cls_str] = {actor_id: [serialized[t.id] for t in ts]
+                          for actor_id, ts in titles.items()}
+    result = []
+    for actor in actors:
+        d = actor.to_json()
+        d['movies'] = works['movie'][actor.id]
+        d['tvs'] = works['tv'][actor.id]
+        result.append(d)
+    return result
+
+
+def paginate(query):
+    page = request.args.get('page', 1, type=int)
+    return query.paginate(page, per_page=current_app.config['FUN123_RESOURCES_PER_PAGE'],
+                          error_out=False)
+
+
+@module.route('/actors/')
+def get_actors():
+    pagination = paginate(Actor.query.order_by(Actor.id))
+    return jsonify({
+        'actors': actors_to_json(pagination.items),
+        'page': pagination.page,
+        'count': pagination.total
+    })
+
+
+@module.route('/actors/<int:id>')
+def get_actor(id):
+    actor = Actor.query.get_or_404(id)
+    return jsonify(actors_to_json([actor])[0])
+
+
+def get_titles(cls_str):
+    model = TITLE_TABLES[cls_str][0]
+    pagination = paginate(model.query.order_by(model.id))
+    return jsonify({
+        cls_str + 's': titles_to_json(pagination.items, cls_str),
+        'page': pagination.page,
+        'count': pagination.total
+    })
+
+
+def get_title(id, cls_str):
+    model = TITLE_TABLES[cls_str][0]
+    title = model.query.get_or_404(id)
+    return jsonify(titles_to_json([title], cls_str)[0])
+
+
+@module.route('/movies/')
+def get_movies():
+    return get_titles('movie')
+
+
+@module.route('/movies/<int:id>')
+def get_movie(id):
+    return get_title(id, 'movie')
+
+
+@module.route('/tvs/')
+def get_tvs():
+    return get_titles('tv')
+
+
+@module.route('/tvs/<int:id>')
+def get_tv(id):
+    return get_title(id, 'tv')
+
+
+def mark_items():
+    """从请求体{'items': [{'type': 'movie', 'id': 1}, ...]}中取出(cls_str, id)对。"""
+    body = request.get_json(silent=True)
+    items = body.get('items') if isinstance(body, dict) else None
+    if not isinstance(items, list):
+        raise ValidationError('items必须是列表。')
+    result = []
+    for item in items:
+        if not isinstance(item, dict) or not isinstance(item.get('type'), str):
+            raise ValidationError('每一项都必须包含字符串type。')
+        id = item.get('id')
+        if not isinstance(id, int) or isinstance(id, bool) or not -2 ** 63 <= id < 2 ** 63:
+            raise ValidationError('每一项都必须包含64位整数id。')
+        result.append((item['type'].lower(), id))
+    return result
+
+
+@module.route('/marks/', methods=['POST'])
+@login_required
+@permission_required(Permission.MARK)
+def mark_many():
+    results = current_user.mark_many(mark_items())
+    db.session.commit()
+    return jsonify({'results': results})
+
+
+@module.route('/marks/', methods=['DELETE'])
+@login_required
+@permission_required(Permission.MARK)
+def unmark_many():
+    results = current_user.unmark_many(mark_items())
+    db.session.commit()
+    return jsonify({'results': results})
@@ -8,6 +8,7 @@ class Config(object):
     SQLALCHEMY_RECORD_QUERIES = True
     SLOW_DB_QUERY_TIME = 0.5
     FUN123_POSTS_PER_PAGE = 20
+    FUN123_RESOURCES_PER_PAGE = 20
     FOLLOWERS_PER_PAGE = 20
     COMMENTS_PER_PAGE = 20
     MAIL_SUBJECT_PREFIX = '[Fun123]'
@@ -20,6 +21,7 @@ class Config(object):
     MAIL_USERNAME = os.environ.get('MAIL_USERNAME')
     MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD')
     SSL_DISABLE = True
+    METRICS_DIR = os.environ.get('METRICS_DIR') or os.path.join(basedir, 'tmp/metrics')
 
     @staticmethod
     def init_app(app):
@@ -37,6 +39,15 @@ class TestConfig(Config):
     WTF_CSRF_ENABLED = False
     SQLALCHEMY_DATABASE_URI = os.environ.get('TEST_DATABASE_URL') or \
                               'sqlite:///' + os.path.join(basedir, 'data-test.sqlite')
+    METRICS_DIR = os.environ.get('TEST_METRICS_DIR')
+
+    @classmethod
+    def init_app(cls, app):
+        Config.init_app(app)
+        if cls.METRICS_DIR is None:
+            import atexit, shutil, tempfile
+            app.config['METRICS_DIR'] = tempfile.mkdtemp(prefix='fun123-metrics-')
+            atexit.register(shutil.rmtree, app.config['METRICS_DIR'], True)
 
 
 class ProdConfig(Config):
@@ -0,0 +1,117 @@
+import json
+import unittest
+from flask_login.utils import _create_identifier
+from sqlalchemy import event
+from app import create_app, db, models
+from app.models import User, Role, Movie, TV, MarkMovie, MarkTV
+
+ENVIRON = {'REMOTE_ADDR': '127.0.0.1', 'HTTP_USER_AGENT': 'tests'}
+
+
+class MarksAPITestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('test')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        self.client = self.app.test_client()
+
+        self.user = User(username='u1', role=Role.query.filter_by(name='User').first())
+        db.session.add_all([self.user, Movie(name='m1'), Movie(name='m2'), Movie(name='m3'),
+                            TV(name='t1'), TV(name='t2')])
+        db.session.commit()
+        db.session.add(MarkMovie(user=self.user, movie=Movie.query.get(1)))
+        db.session.commit()
+
+        with self.app.test_request_context(environ_base=ENVIRON):
+            identifier = _create_identifier()
+        with self.client.session_transaction() as sess:
+            sess['user_id'] = str(self.user.id)
+            sess['_fresh'] = True
+            sess['_id'] = identifier
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def request(self, method, items):
+        response = self.client.open('/api/module/v1.0/marks/', method=method,
+                                    data=json.dumps({'items': items}),
+                                    content_type='application/json', environ_base=ENVIRON)
+        self.assertEqual(response.status_code, 200)
+        return [r['result'] for r in json.loads(response.get_data(as_text=True))['results']]
+
+    def count_statements(self, f, *args):
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+        event.listen(db.engine, 'before_cursor_execute', record)
+        try:
+            f(*args)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+        return len(statements)
+
+    def test_mark(self):
+        items = [{'type': 'movie', 'id': 1}, {'type': 'movie', 'id': 2},
+                 {'type': 'Movie', 'id': 99}, {'type': 'tv', 'id': 2},
+                 {'type': 'song', 'id': 1}]
+        self.assertEqual(self.request('POST', items),
+                         ['exists', 'marked', 'not_found', 'marked', 'invalid'])
+        self.assertEqual(sorted(m.movie_id for m in self.user.movies), [1, 2])
+        self.assertEqual([m.tv_id for m in self.user.tvs], [2])
+
+        self.assertEqual(self.request('POST', items),
+                         ['exists', 'exists', 'not_found', 'exists', 'invalid'])
+        self.assertEqual(MarkMovie.query.count(), 2)
+
+    def test_unmark(self):
+        self.request('POST', [{'type': 'tv', 'id': 1}])
+        items = [{'type': 'movie', 'id': 1}, {'type': 'movie', 'id': 2},
+                 {'type': 'tv', 'id': 1}, {'type': 'song', 'id': 1}]
+        self.assertEqual(self.request('DELETE', items),
+                         ['unmarked', 'not_marked', 'unmarked', 'invalid'])
+        self.assertEqual(MarkMovie.query.count(), 0)
+        self.assertEqual(MarkTV.query.count(), 0)
+
+    def test_bad_request(self):
+        bodies = [[1], 'x', 5, {'items': {}}, {'items': [1]},
+                  {'items': [{'type': 'movie'}]}, {'items': [{'id': 1}]},
+                  {'items': [{'type': 1, 'id': 1}]}]
+        bodies += [{'items': [{'type': 'movie', 'id': id}]}
+                   for id in (True, 2.7, '1', None, 10 ** 30, 2 ** 63, -2 ** 63 - 1)]
+        for body in bodies:
+            response = self.client.post('/api/module/v1.0/marks/', data=json.dumps(body),
+                                        content_type='application/json', environ_base=ENVIRON)
+            self.assertEqual(response.status_code, 400, body)
+        self.assertEqual(MarkMovie.query.count(), 1)
+        self.assertEqual(self.request('POST', [{'type': 'movie', 'id': 2 ** 63 - 1}]),
+                         ['not_found'])
+
+    def test_insert_conflict_ignored(self):
+        table = MarkMovie.__table__
+        db.session.execute(models.insert_ignore(table).values(
+            [{'user_id': self.user.id, 'movie_id': 1}, {'user_id': self.user.id, 'movie_id': 2}]))
+        db.session.commit()
+        self.assertEqual(MarkMovie.query.count(), 2)
+
+    def test_query_count(self):
+        items = [('movie', 1), ('movie', 2), ('movie', 3), ('tv', 1), ('tv', 2)]
+        self.assertEqual(self.count_statements(self.user.mark_many, items), 6)
+        self.assertEqual(self.count_statements(self.user.unmark_many, items), 4)
+
+    def test_chunked(self):
+        chunk_size = models.MARK_CHUNK_SIZE
+        models.MARK_CHUNK_SIZE = 2
+        try:
+            items = [('movie', 1), ('movie', 2), ('movie', 3), ('movie', 4)]
+            self.assertEqual(self.count_statements(self.user.mark_many, items), 6)
+            self.assertEqual([r['result'] for r in self.user.mark_many(items)],
+                             ['exists', 'exists', 'exists', 'not_found'])
+            self.assertEqual(self.count_statements(self.user.unmark_many, items), 4)
+        finally:
+            models.MARK_CHUNK_SIZE = chunk_size
+        self.assertEqual(MarkMovie.query.count(), 0)
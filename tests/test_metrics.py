@@ -0,0 +1,137 @@
+import multiprocessing
+import os
+import re
+import shutil
+import tempfile
+import unittest
+from config import TestConfig
+from app import create_app, metrics
+
+WORKERS = 4
+
+
+def parse(text):
+    """把/metrics的输出解析成{(name, labels): value}。"""
+    samples = {}
+    for line in text.splitlines():
+        if line.startswith('#'):
+            continue
+        name, labels, value = re.match(r'(\w+)\{(.*)\} (\S+)$', line).groups()
+        samples[name, labels] = float(value)
+    return samples
+
+
+class TestConfigTestCase(unittest.TestCase):
+    def test_metrics_dir(self):
+        app = create_app('test')
+        directory = app.config['METRICS_DIR']
+        self.assertTrue(os.path.isdir(directory))
+        self.assertNotEqual(directory, create_app('test').config['METRICS_DIR'])
+        basedir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        self.assertFalse(directory.startswith(basedir))
+
+
+class MetricsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.metrics_dir = TestConfig.METRICS_DIR
+        TestConfig.METRICS_DIR = self.directory
+        self.app = create_app('test')
+        self.app.config['PRESERVE_CONTEXT_ON_EXCEPTION'] = False
+
+        @self.app.route('/boom')
+        def boom():
+            raise RuntimeError('boom')
+
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        TestConfig.METRICS_DIR = self.metrics_dir
+        shutil.rmtree(self.directory)
+
+    def run_workers(self, target, *args):
+        ctx = multiprocessing.get_context('fork')
+        workers = [ctx.Process(target=target, args=args) for _ in range(WORKERS)]
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+            self.assertEqual(w.exitcode, 0)
+
+    def scrape(self):
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith('text/plain'))
+        return parse(response.get_data(as_text=True))
+
+    def test_workers(self):
+        def work():
+            client = self.app.test_client()
+            for i in range(5):
+                client.get('/api/main/v1.0/test')
+            client.get('/api/main/v1.0/missing')
+            client.get('/some/page')
+
+        self.run_workers(work)
+        self.assertEqual(len(os.listdir(self.directory)), WORKERS)
+        samples = self.scrape()
+        requests = 'fun123_http_requests_total'
+        self.assertEqual(samples[requests, 'blueprint="main",endpoint="main.test",'
+                                           'method="GET",status="200"'], 5 * WORKERS)
+        self.assertEqual(samples[requests, 'blueprint="catch_all",endpoint="catch_all",'
+                                           'method="GET",status="200"'], 2 * WORKERS)
+        duration = 'fun123_http_request_duration_seconds'
+        labels = 'blueprint="main",endpoint="main.test"'
+        self.assertEqual(samples[duration + '_count', labels], 5 * WORKERS)
+        self.assertEqual(samples[duration + '_bucket', labels + ',le="+Inf"'], 5 * WORKERS)
+        buckets = [v for (name, l), v in sorted(samples.items())
+                   if name == duration + '_bucket' and l.startswith(labels + ',')]
+        self.assertEqual(len(buckets), 12)
+        self.assertEqual(max(buckets), 5 * WORKERS)
+        self.assertGreater(samples[duration + '_sum', labels], 0)
+
+    def test_server_error(self):
+        with self.assertRaises(RuntimeError):
+            self.client.get('/boom')
+        samples = self.scrape()
+        self.assertEqual(samples['fun123_http_requests_total',
+                                 'blueprint="boom",endpoint="boom",method="GET",status="500"'], 1)
+        self.assertEqual(samples['fun123_http_request_duration_seconds_count',
+                                 'blueprint="boom",endpoint="boom"'], 1)
+
+    def test_labels(self):
+        for method in ('X0', 'X1', 'X2', 'POST'):
+            response = self.client.open('/api/main/v1.0/test', method=method)
+            self.assertEqual(response.status_code, 405)
+        samples = self.scrape()
+        requests = [l for name, l in samples if name == 'fun123_http_requests_total']
+        self.assertEqual(sorted(requests), [
+            'blueprint="none",endpoint="none",method="POST",status="405"',
+            'blueprint="none",endpoint="none",method="other",status="405"'])
+        self.assertEqual(samples['fun123_http_requests_total',
+                                 'blueprint="none",endpoint="none",method="other",status="405"'], 3)
+
+    def test_file_growth(self):
+        def work():
+            for i in range(2000):
+                metrics.observe('module', 'module.e{}'.format(i % 300), 'GET', 200,
+                                0.001 if i % 2 else 0.3)
+
+        self.run_workers(work)
+        for name in os.listdir(self.directory):
+            self.assertGreater(os.path.getsize(os.path.join(self.directory, name)), 1 << 16)
+        samples = self.scrape()
+        requests = [v for (name, l), v in samples.items()
+                    if name == 'fun123_http_requests_total']
+        self.assertEqual(len(requests), 300)
+        self.assertEqual(sum(requests), 2000 * WORKERS)
+        labels = 'blueprint="module",endpoint="module.e1"'
+        count = samples['fun123_http_request_duration_seconds_count', labels]
+        self.assertEqual(count, 7 * WORKERS)
+        self.assertEqual(samples['fun123_http_request_duration_seconds_bucket',
+                                 labels + ',le="0.005"'], count)
+        labels = 'blueprint="module",endpoint="module.e0"'
+        self.assertEqual(samples['fun123_http_request_duration_seconds_bucket',
+                                 labels + ',le="0.25"'], 0)
+        self.assertEqual(samples['fun123_http_request_duration_seconds_bucket',
+                                 labels + ',le="0.5"'], 7 * WORKERS)
@@ -0,0 +1,106 @@
+import json
+import unittest
+from sqlalchemy import event
+from app import create_app, db
+from app.models import User, Actor, Movie, TV, MarkMovie, MarkTV
+
+
+class ModuleAPITestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('test')
+        self.app.config['FUN123_RESOURCES_PER_PAGE'] = 2
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.client = self.app.test_client()
+
+        m1, m2, m3 = Movie(name='m1'), Movie(name='m2'), Movie(name='m3')
+        t1, t2 = TV(name='t1'), TV(name='t2')
+        a1 = Actor(name='a1', movies=[m1, m2], tvs=[t1])
+        a2 = Actor(name='a2', movies=[m2, m3], tvs=[t1, t2])
+        a3 = Actor(name='a3', movies=[m1, m3], tvs=[t2])
+        u1, u2 = User(username='u1'), User(username='u2')
+        db.session.add_all([m1, m2, m3, t1, t2, a1, a2, a3, u1, u2])
+        db.session.add_all([MarkMovie(user=u1, movie=m1), MarkMovie(user=u1, movie=m2),
+                            MarkMovie(user=u2, movie=m1), MarkTV(user=u1, tv=t1),
+                            MarkTV(user=u2, tv=t2)])
+        db.session.commit()
+        db.session.remove()
+
+        self.statements = []
+        event.listen(db.engine, 'before_cursor_execute', self.record)
+
+    def tearDown(self):
+        event.remove(db.engine, 'before_cursor_execute', self.record)
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def get(self, url):
+        db.session.remove()
+        del self.statements[:]
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.get_data(as_text=True))
+
+    def test_actors(self):
+        data = self.get('/api/module/v1.0/actors/')
+        self.assertEqual(len(self.statements), 8)
+        self.assertEqual(data['count'], 3)
+        self.assertEqual([a['name'] for a in data['actors']], ['a1', 'a2'])
+        a2 = data['actors'][1]
+        self.assertEqual(sorted(a2), ['id', 'movies', 'name', 'pic_url', 'tvs'])
+        self.assertEqual([m['name'] for m in a2['movies']], ['m2', 'm3'])
+        self.assertEqual([a['name'] for a in a2['movies'][0]['actors']], ['a1', 'a2'])
+        self.assertEqual(a2['movies'][0]['marks'], 1)
+        self.assertEqual([t['marks'] for t in a2['tvs']], [1, 1])
+
+        data = self.get('/api/module/v1.0/actors/?page=2')
+        self.assertEqual(len(self.statements), 8)
+        self.assertEqual([a['name'] for a in data['actors']], ['a3'])
+
+    def test_actor(self):
+        data = self.get('/api/module/v1.0/actors/1')
+        self.assertEqual(len(self.statements), 7)
+        self.assertEqual(data['name'], 'a1')
+        self.assertEqual([m['name'] for m in data['movies']], ['m1', 'm2'])
+        m1 = data['movies'][0]
+        self.assertEqual(sorted(m1), ['actors', 'id', 'marks', 'name', 'pic_url'])
+        self.assertEqual([a['name'] for a in m1['actors']], ['a1', 'a3'])
+        self.assertEqual(m1['marks'], 2)
+        self.assertEqual([a['name'] for a in data['tvs'][0]['actors']], ['a1', 'a2'])
+
+    def test_movies(self):
+        data = self.get('/api/module/v1.0/movies/')
+        self.assertEqual(len(self.statements), 4)
+        self.assertEqual(data['count'], 3)
+        self.assertEqual([m['name'] for m in data['movies']], ['m1', 'm2'])
+        self.assertEqual([m['marks'] for m in data['movies']], [2, 1])
+        self.assertEqual([a['name'] for a in data['movies'][1]['actors']], ['a1', 'a2'])
+
+    def test_movie(self):
+        data = self.get('/api/module/v1.0/movies/3')
+        self.assertEqual(len(self.statements), 3)
+        self.assertEqual(data['name'], 'm3')
+        self.assertEqual([a['name'] for a in data['actors']], ['a2', 'a3'])
+        self.assertEqual(data['marks'], 0)
+
+    def test_tvs(self):
+        data = self.get('/api/module/v1.0/tvs/')
+        self.assertEqual(len(self.statements), 4)
+        self.assertEqual(data['count'], 2)
+        self.assertEqual([t['marks'] for t in data['tvs']], [1, 1])
+        self.assertEqual([a['name'] for a in data['tvs'][1]['actors']], ['a2', 'a3'])
+
+    def test_tv(self):
+        data = self.get('/api/module/v1.0/tvs/2')
+        self.assertEqual(len(self.statements), 3)
+        self.assertEqual(sorted(data), ['actors', 'id', 'marks', 'name', 'pic_url'])
+        self.assertEqual([a['name'] for a in data['actors']], ['a2', 'a3'])
+
+    def test_missing(self):
+        response = self.client.get('/api/module/v1.0/actors/99')
+        self.assertEqual(response.status_code, 404)